@@ -1,18 +1,32 @@
 import sys
 import os
 from datetime import datetime
+from prompt_toolkit import PromptSession
+from prompt_toolkit.completion import WordCompleter
 from rich.console import Console
-from rich.prompt import Prompt, Confirm
+from rich.prompt import Confirm
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 import scraper
 
 console = Console()
 
+# One shared prompt session renders far cheaper than a fresh Rich prompt
+# per field. The completers are cached at module scope since STATES is
+# constant; autocompletion also avoids typo-driven empty API queries.
+_PROMPT_SESSION = PromptSession()
+_STATE_COMPLETER = WordCompleter(scraper.STATES, ignore_case=True)
+
 def get_date_input(prompt_text, default=None):
-    """Prompts for a date input in DD/MM/YYYY format."""
+    """
+    Prompts for a date input in DD/MM/YYYY format. Empty input falls
+    back to `default` (or returns None); the default is shown in the
+    label rather than prefilled, so typed or piped input replaces it
+    instead of being appended to it.
+    """
     while True:
-        date_str = Prompt.ask(prompt_text, default=default)
+        label = f"{prompt_text} [{default}]: " if default else f"{prompt_text}: "
+        date_str = _PROMPT_SESSION.prompt(label).strip() or default
         if not date_str:
             return None
         try:
@@ -32,9 +46,13 @@ def main():
     while True:
         console.print("\n[bold]Step 1: Define Filters[/bold] (Press Enter to skip/leave empty)")
         
-        commodity = Prompt.ask("Commodity (e.g. [green]Wheat[/green])").strip() or None
-        state = Prompt.ask("State (e.g. [green]Punjab[/green])").strip() or None
-        district = Prompt.ask("District (e.g. [green]Agra[/green])").strip() or None
+        commodity = _PROMPT_SESSION.prompt("Commodity (e.g. Wheat): ").strip() or None
+        state = _PROMPT_SESSION.prompt(
+            "State (e.g. Punjab, Tab to complete): ",
+            completer=_STATE_COMPLETER,
+            complete_while_typing=True,
+        ).strip() or None
+        district = _PROMPT_SESSION.prompt("District (e.g. Agra): ").strip() or None
         
         console.print("\n[bold]Step 2: Define Date Range[/bold]")
         use_today = Confirm.ask("Do you want to fetch data for [bold]TODAY[/bold] only?", default=True)
@@ -93,7 +111,7 @@ def main():
         # Save Data
         if records:
             console.print(f"\n[bold green]Success![/bold green] Found {len(records)} records.")
-            filename = Prompt.ask("Output Filename", default="mandi_prices_master.csv")
+            filename = _PROMPT_SESSION.prompt("Output Filename [mandi_prices_master.csv]: ").strip() or "mandi_prices_master.csv"
             scraper.save_to_csv(records, filename)
         else:
             console.print("\n[bold red]No records found matching your criteria.[/bold red]")
@@ -1,20 +1,72 @@
 import requests
+import requests_cache
 import csv
+import gzip
+import io
 import os
 import sys
+import threading
 import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import httpx
+import orjson
 import pandas as pd
 from dotenv import load_dotenv
+from lxml import html as lxml_html
 from playwright.sync_api import sync_playwright
 import time
 
 # Load environment variables
 load_dotenv()
 
+# Resolved once at import; the environment doesn't change mid-run.
+_API_KEY = os.getenv("DATA_GOV_IN_API_KEY")
+
+# Day boundaries applied when normalizing filter dates.
+_START_OF_DAY = dict(hour=0, minute=0, second=0, microsecond=0)
+_END_OF_DAY = dict(hour=23, minute=59, second=59, microsecond=999999)
+
 # Constants
 API_ENDPOINT = "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070"
 DEFAULT_LIMIT = 1000  # Records per page
+MAX_CONCURRENT_REQUESTS = 8  # Semaphore cap so we don't hammer data.gov.in
+REQUEST_TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_DAYWISE_SPAN = 31  # Partition a date range into per-day API queries only up to this many days
+MARKETING_BOARD_GRID_ID = "cphBody_GridPriceData"  # id of the report GridView on the Agmarknet page
+API_RECORD_CAP = 9000  # Shard by state only when a query exceeds this (API paginates up to ~10k)
+
+# One shared session for all synchronous HTTP: keeps TCP+TLS connections
+# alive across pages and states instead of re-handshaking per request.
+# Responses are cached on disk keyed by the full URL (filters, date,
+# offset), so repeated interactive queries within the data.gov.in
+# publish cadence are served locally instead of re-fetched.
+_SESSION = requests_cache.CachedSession(
+    "mandi_cache",
+    backend="sqlite",
+    expire_after=3600,
+    allowable_methods=("GET",),
+    stale_if_error=True,
+)
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=8,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+    ),
+))
+_SESSION.headers["Accept-Encoding"] = "gzip"
+
+# Caps in-flight sync requests across nested executors (the per-day
+# fan-out runs a page-prefetch pool inside each worker), mirroring the
+# asyncio.Semaphore that gates the async path.
+_REQUEST_SEMAPHORE = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
 
 STATES = [
     "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat", 
@@ -25,14 +77,98 @@ STATES = [
     "Dadra and Nagar Haveli", "Daman and Diu", "Lakshadweep", "Delhi", "Puducherry"
 ]
 
+def _extract_report_table(html):
+    """
+    Parses the report grid out of the page HTML. Targeting the grid's id
+    lets lxml build just that one table instead of every nav/layout
+    table on the page; the old largest-table heuristic remains as a
+    fallback in case the id ever changes. Returns None if no table.
+    """
+    # pandas 2.1+ requires literal HTML to be wrapped in a file-like
+    # object; passing the raw string raises FileNotFoundError on 3.x.
+    try:
+        return pd.read_html(io.StringIO(html), flavor="lxml", attrs={"id": MARKETING_BOARD_GRID_ID})[0]
+    except ValueError:
+        pass
+
+    try:
+        dfs = pd.read_html(io.StringIO(html), flavor="lxml")
+    except ValueError:
+        return None
+    return max(dfs, key=len) if dfs else None
+
+def _save_scraped_table(df):
+    """Saves one scraped HTML table to a dated CSV."""
+    print(f"Found table with {len(df)} rows.")
+    filename = f"mandi_prices_web_scraped_{datetime.now().strftime('%Y%m%d')}.csv"
+    df.to_csv(filename, index=False)
+    print(f"Saved scraped data to {filename}")
+
+def _replay_marketing_board_form(url):
+    """
+    Replays the ASP.NET WebForms postback directly: one GET to harvest
+    the hidden __VIEWSTATE/__EVENTVALIDATION fields, then one POST of
+    the form — no browser involved. Returns the result HTML.
+    """
+    # The form GET must bypass the response cache: a stale __VIEWSTATE
+    # would make the server reject the postback.
+    with _SESSION.cache_disabled():
+        response = _SESSION.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        tree = lxml_html.fromstring(response.content)
+
+        form_data = {}
+        for hidden in tree.xpath("//input[@type='hidden']"):
+            name = hidden.get("name")
+            if name:
+                form_data[name] = hidden.get("value", "")
+
+        submits = tree.xpath("//input[@type='submit']")
+        if submits and submits[0].get("name"):
+            form_data[submits[0].get("name")] = submits[0].get("value", "Submit")
+
+        response = _SESSION.post(url, data=form_data, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.text
+
 def scrape_marketing_board_web():
     """
-    Scrapes the Agmarknet website using Playwright.
+    Scrapes the Agmarknet website. Replays the report form POST with
+    plain requests first (~1 s instead of a 15 s headless-browser
+    session); falls back to Playwright only if that yields no table.
     """
     url = "https://agmarknet.gov.in/PriceAndArrivals/DatewiseCommodityReport.aspx"
-    
+
+    print(f"Requesting {url} directly...")
+    df = None
+    try:
+        html = _replay_marketing_board_form(url)
+    except Exception as e:
+        print(f"Direct request failed: {e}")
+        html = None
+
+    # Parse failures are reported separately so a parser regression is
+    # not mistaken for the site being unreachable.
+    if html:
+        try:
+            df = _extract_report_table(html)
+        except Exception as e:
+            print(f"Failed to parse the direct response: {e}")
+
+    if df is not None:
+        _save_scraped_table(df)
+        return df
+
+    print("No table from direct request. Falling back to Playwright...")
+    return _scrape_marketing_board_playwright(url)
+
+def _scrape_marketing_board_playwright(url):
+    """
+    Scrapes the Agmarknet website using Playwright. Fallback for when
+    the direct form replay returns no table.
+    """
     print(f"Launching browser to scrape {url}...")
-    
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
@@ -54,14 +190,10 @@ def scrape_marketing_board_web():
             page.wait_for_selector(table_selector, timeout=10000)
             
             html = page.content()
-            dfs = pd.read_html(html)
-            
-            if dfs:
-                df = max(dfs, key=len)
-                print(f"Found table with {len(df)} rows.")
-                filename = f"mandi_prices_web_scraped_{datetime.now().strftime('%Y%m%d')}.csv"
-                df.to_csv(filename, index=False)
-                print(f"Saved scraped data to {filename}")
+            df = _extract_report_table(html)
+
+            if df is not None:
+                _save_scraped_table(df)
                 return df
             else:
                 print("No tables found in the page content.")
@@ -75,16 +207,145 @@ def scrape_marketing_board_web():
 
 def get_api_key():
     """Retrieves API key from environment variable or user input."""
-    api_key = os.getenv("DATA_GOV_IN_API_KEY")
-    if not api_key:
-        print("API Key not found in environment variables.")
-        api_key = input("Please enter your data.gov.in API Key: ").strip()
-    return api_key
+    if _API_KEY:
+        return _API_KEY
+    print("API Key not found in environment variables.")
+    return input("Please enter your data.gov.in API Key: ").strip()
+
+def _normalize_dates(from_date, to_date):
+    """Normalizes the filter dates so comparisons cover whole days."""
+    if from_date:
+        from_date = from_date.replace(**_START_OF_DAY)
+    if to_date:
+        to_date = to_date.replace(**_END_OF_DAY) # Set to end of day for inclusive comparison
+    return from_date, to_date
+
+def _build_params(api_key, commodity, state, district, limit, offset, arrival_date=None):
+    """Builds the query params dict for one API page."""
+    params = {
+        "api-key": api_key,
+        "format": "json",
+        "limit": limit,
+        "offset": offset
+    }
+
+    # Apply API-side filters
+    if commodity:
+        params["filters[commodity]"] = commodity
+    if state:
+        params["filters[state]"] = state
+    if district:
+        params["filters[district]"] = district
+    if arrival_date:
+        params["filters[arrival_date]"] = arrival_date
+    return params
+
+def _arrival_date_filters(from_date, to_date):
+    """
+    Returns the "DD/MM/YYYY" day strings to push down to the API as
+    filters[arrival_date], or None when the range is open-ended or too
+    wide to be worth partitioning into per-day queries.
+    """
+    if not (from_date and to_date):
+        return None
+    span = (to_date.date() - from_date.date()).days + 1
+    if span > MAX_DAYWISE_SPAN:
+        return None
+    return [d.strftime("%d/%m/%Y") for d in pd.date_range(from_date.date(), to_date.date())]
 
-def fetch_data(api_key, commodity=None, state=None, district=None, from_date=None, to_date=None, limit=DEFAULT_LIMIT):
+def _filter_records(records, from_date, to_date):
+    """
+    Applies the client-side date filter to one page of records.
+    The DD/MM/YYYY strings are parsed and compared as one vectorized
+    pandas operation instead of a per-record Python loop.
+    """
+    if not records:
+        return []
+    if not (from_date or to_date):
+        return list(records)
+
+    df = pd.DataFrame(records)
+    if "arrival_date" not in df.columns:
+        return []
+
+    dates = pd.to_datetime(df["arrival_date"], format="%d/%m/%Y", errors="coerce", cache=True)
+    # Records with missing or unparseable dates are skipped whenever a
+    # date filter is set, matching the previous per-record semantics.
+    mask = dates.notna()
+    if from_date:
+        mask &= dates >= from_date
+    if to_date:
+        mask &= dates <= to_date
+
+    return df[mask].to_dict("records")
+
+def _get_page(params):
+    """Fetches one API page over the shared pooled session."""
+    with _REQUEST_SEMAPHORE:
+        response = _SESSION.get(API_ENDPOINT, params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    # orjson decodes the wide record payloads noticeably faster than the
+    # stdlib decoder behind response.json().
+    return orjson.loads(response.content)
+
+def _fetch_pages(api_key, commodity, state, district, limit, arrival_date=None):
+    """
+    Fetches every page for one API-side filter combination.
+
+    The first page is fetched alone to learn how many records match the
+    API-side filters; the remaining page offsets are then known and
+    independent, so they are prefetched in parallel over the pooled
+    keep-alive session instead of waiting one RTT per page.
+    Note: "total" in the response refers to TOTAL MATCHING API FILTERS,
+    NOT including any client-side date filter.
+    """
+    try:
+        data = _get_page(_build_params(api_key, commodity, state, district, limit, 0, arrival_date))
+    except requests.exceptions.RequestException as e:
+        print(f"Network error: {e}")
+        return []
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return []
+
+    if "records" not in data:
+        print("Error: 'records' key not found in response. Check API Key or limit.")
+        # print(f"Response: {data}") # Debugging
+        return []
+
+    pages = [data["records"]]
+    # "total" arrives as a JSON number, so no int() cast is needed; it is
+    # read once here since it never changes between pages.
+    total_api_matches = data.get("total", len(pages[0]))
+
+    if total_api_matches > limit:
+        offsets = range(limit, total_api_matches, limit)
+        print(f"{total_api_matches} matching API records; prefetching {len(offsets)} remaining pages in parallel...")
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            futures = [
+                executor.submit(_get_page, _build_params(api_key, commodity, state, district, limit, offset, arrival_date))
+                for offset in offsets
+            ]
+            # Futures are collected in submission order so pages stay ordered.
+            # Any per-page failure — transport error or a non-JSON body from
+            # a flaky gateway — is logged and skipped, never fatal.
+            for future in futures:
+                try:
+                    page = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"Network error: {e}")
+                    continue
+                except Exception as e:
+                    print(f"An error occurred: {e}")
+                    continue
+                pages.append(page.get("records") or [])
+
+    return pages
+
+def fetch_data(api_key, commodity=None, state=None, district=None, from_date=None, to_date=None, limit=DEFAULT_LIMIT, output_path=None):
     """
     Fetches data from Agmarknet API with optional filters.
-    
+
     Args:
         api_key (str): The API key.
         commodity (str): Filter by crop/commodity name.
@@ -93,17 +354,14 @@ def fetch_data(api_key, commodity=None, state=None, district=None, from_date=Non
         from_date (datetime): Start date for filtering.
         to_date (datetime): End date for filtering.
         limit (int): Records per page.
+        output_path (str): When given, filtered records are streamed to
+            this CSV as pages arrive and the record count is returned
+            instead of the list, keeping peak memory at one page.
     """
-    all_records = []
-    offset = 0
-    
     print("Starting data fetch...")
-    
+
     # Normalize dates to remove time component for comparison
-    if from_date:
-        from_date = from_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    if to_date:
-        to_date = to_date.replace(hour=23, minute=59, second=59, microsecond=999999) # Set to end of day for inclusive comparison
+    from_date, to_date = _normalize_dates(from_date, to_date)
 
     if commodity: print(f"Filter: Commodity='{commodity}'")
     if state: print(f"Filter: State='{state}'")
@@ -111,93 +369,229 @@ def fetch_data(api_key, commodity=None, state=None, district=None, from_date=Non
     if from_date: print(f"Filter: From Date='{from_date.strftime('%d/%m/%Y')}'")
     if to_date: print(f"Filter: To Date='{to_date.strftime('%d/%m/%Y')}'")
 
-    while True:
-        params = {
-            "api-key": api_key,
-            "format": "json",
-            "limit": limit,
-            "offset": offset
-        }
-        
-        # Apply API-side filters
-        if commodity:
-            params["filters[commodity]"] = commodity
-        if state:
-            params["filters[state]"] = state
-        if district:
-            params["filters[district]"] = district
+    day_filters = _arrival_date_filters(from_date, to_date)
 
-        try:
-            response = requests.get(API_ENDPOINT, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if "records" not in data:
-                print("Error: 'records' key not found in response. Check API Key or limit.")
-                # print(f"Response: {data}") # Debugging
-                break
-            
-            records = data["records"]
-            if not records:
-                break  # No more data
-            
-            # Date Filtering (Client-side)
-            # The API returns date as "DD/MM/YYYY" string.
-            filtered_records = []
-            
-            for record in records:
-                try:
-                    record_date_str = record.get("arrival_date", "")
-                    if not record_date_str:
-                        # Decide whether to keep or skip records without dates. 
-                        # Assuming we keep them if no date filter is applied, skip if it is.
-                        if from_date or to_date:
-                            continue
-                        else:
-                            filtered_records.append(record)
-                            continue
-
-                    record_date = datetime.strptime(record_date_str, "%d/%m/%Y")
-                    
-                    if from_date and record_date < from_date:
-                        continue
-                    if to_date and record_date > to_date:
+    all_records = []
+    total_kept = 0
+    out_file = None
+    writer = None
+
+    def _collect(filtered_records):
+        """Accumulates in memory, or streams straight to the output CSV."""
+        nonlocal total_kept, out_file, writer
+        total_kept += len(filtered_records)
+        if output_path is None:
+            all_records.extend(filtered_records)
+            return
+        if not filtered_records:
+            return
+        if writer is None:
+            out_file = _open_csv_output(output_path)
+            # The header is fixed from the first page; schemas can drift
+            # between pages, so keys that appear later are dropped rather
+            # than aborting the scan mid-write.
+            writer = csv.DictWriter(out_file, fieldnames=list(filtered_records[0].keys()), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerows(filtered_records)
+
+    try:
+        if day_filters is not None:
+            # Narrow range: let the API do the date filtering. One query per
+            # day, fetched in parallel, instead of downloading every page and
+            # discarding most of it client-side.
+            print(f"Pushing date filter down to the API ({len(day_filters)} day(s))...")
+            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+                futures = [
+                    executor.submit(_fetch_pages, api_key, commodity, state, district, limit, day)
+                    for day in day_filters
+                ]
+                for future in futures:
+                    try:
+                        day_pages = future.result()
+                    except Exception as e:
+                        print(f"An error occurred: {e}")
                         continue
-                    
-                    filtered_records.append(record)
-                    
-                except ValueError:
-                    print(f"Warning: Could not parse date '{record_date_str}'")
-                    # If date parsing fails, similar logic to missing date
-                    if not (from_date or to_date):
-                         filtered_records.append(record)
+                    for records in day_pages:
+                        _collect(records)
+            print(f"Fetched {total_kept} records (date filter applied API-side).")
+        else:
+            pages = _fetch_pages(api_key, commodity, state, district, limit)
+            for records in pages:
+                # Date Filtering (Client-side)
+                filtered_records = _filter_records(records, from_date, to_date)
+                _collect(filtered_records)
+                print(f"Fetched {len(records)} raw API records. Kept {len(filtered_records)} after date filtering. Total Kept: {total_kept}")
+    finally:
+        if out_file is not None:
+            out_file.close()
 
+    if output_path is not None:
+        print(f"Streamed {total_kept} records to {output_path}")
+        return total_kept
+    return all_records
+
+async def _aget_page(client, params, semaphore=None):
+    """Fetches one API page over the shared async client."""
+    if semaphore is not None:
+        async with semaphore:
+            return await _aget_page(client, params)
+    response = await client.get(API_ENDPOINT, params=params)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+async def _afetch_pages(client, api_key, commodity, state, district, limit, arrival_date=None, semaphore=None):
+    """
+    Async counterpart of _fetch_pages: learns "total" from the first
+    page, then gathers the remaining known offsets concurrently.
+    """
+    try:
+        data = await _aget_page(client, _build_params(api_key, commodity, state, district, limit, 0, arrival_date), semaphore=semaphore)
+    except httpx.HTTPError as e:
+        print(f"Network error for state '{state}': {e}")
+        return []
+    except Exception as e:
+        print(f"An error occurred for state '{state}': {e}")
+        return []
+
+    if "records" not in data:
+        print(f"Error: 'records' key not found in response for state '{state}'. Check API Key or limit.")
+        return []
+
+    pages = [data["records"]]
+    total_api_matches = data.get("total", len(pages[0]))
+
+    if total_api_matches > limit:
+        offsets = range(limit, total_api_matches, limit)
+        results = await asyncio.gather(
+            *[
+                _aget_page(client, _build_params(api_key, commodity, state, district, limit, offset, arrival_date), semaphore=semaphore)
+                for offset in offsets
+            ],
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Network error for state '{state}': {result}")
+                continue
+            pages.append(result.get("records") or [])
+
+    return pages
+
+async def afetch_data(client, api_key, commodity=None, state=None, district=None, from_date=None, to_date=None, limit=DEFAULT_LIMIT, semaphore=None):
+    """
+    Async counterpart of fetch_data. Mirrors the same pagination and
+    client-side date filtering, but shares one httpx client so pages
+    for different states can be fetched concurrently.
+    """
+    from_date, to_date = _normalize_dates(from_date, to_date)
+    day_filters = _arrival_date_filters(from_date, to_date)
+
+    all_records = []
+    if day_filters is not None:
+        # Narrow range: push the date filter down to the API, one query
+        # per day, gathered concurrently.
+        results = await asyncio.gather(
+            *[
+                _afetch_pages(client, api_key, commodity, state, district, limit, day, semaphore=semaphore)
+                for day in day_filters
+            ]
+        )
+        for day_pages in results:
+            for records in day_pages:
+                all_records.extend(records)
+        print(f"[{state or 'All States'}] Fetched {len(all_records)} records (date filter applied API-side).")
+    else:
+        pages = await _afetch_pages(client, api_key, commodity, state, district, limit, semaphore=semaphore)
+        for records in pages:
+            filtered_records = _filter_records(records, from_date, to_date)
             all_records.extend(filtered_records)
-            print(f"Fetched {len(records)} raw API records. Kept {len(filtered_records)} after date filtering. Total Kept: {len(all_records)}")
-            
-            # Check total available API records to see if we're done fetching
-            # Note: "total" in response refers to TOTAL MATCHING API FILTERS (commodity/state/district),
-            # NOT including our client-side date filter.
-            if "total" in data:
-                 total_api_matches = int(data["total"])
-                 # calculate how many raw records we have processed (offset + current batch)
-                 records_processed = offset + len(records)
-                 
-                 if records_processed >= total_api_matches:
-                     print("Fetched all matching API records.")
-                     break
-
-            offset += limit
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Network error: {e}")
-            break
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            break
+        print(f"[{state or 'All States'}] Fetched {sum(len(p) for p in pages)} raw API records. Kept {len(all_records)} after date filtering.")
 
     return all_records
 
+async def fetch_all_states(api_key, commodity=None, district=None, from_date=None, to_date=None, limit=DEFAULT_LIMIT, collected=None):
+    """
+    Runs the full per-state scan concurrently, multiplexed over a single
+    HTTP/2 connection and gated by a semaphore to respect API rate
+    limits. When the date range is narrow enough to push down to the
+    API, the whole (state, day) cross product is flattened into one
+    task batch up front so the event loop can overlap every independent
+    request rather than fanning out per state first.
+
+    Each shard's records are also appended to `collected` (when given)
+    as the shard finishes, so the caller can save partial progress if
+    the scan is interrupted mid-way.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limits = httpx.Limits(max_connections=16, max_keepalive_connections=16)
+
+    norm_from, norm_to = _normalize_dates(from_date, to_date)
+    day_filters = _arrival_date_filters(norm_from, norm_to)
+
+    async with httpx.AsyncClient(http2=True, limits=limits, timeout=30) as client:
+        if day_filters is not None:
+            print(f"Scanning {len(STATES)} states x {len(day_filters)} day(s) as one flat batch...")
+
+            async def _fetch_shard(state, day):
+                pages = await _afetch_pages(client, api_key, commodity, state, district, limit, day, semaphore=semaphore)
+                return [record for page in pages for record in page]
+
+            tasks = [_fetch_shard(state, day) for state in STATES for day in day_filters]
+        else:
+            tasks = [
+                afetch_data(
+                    client, api_key,
+                    commodity=commodity,
+                    state=state,
+                    district=district,
+                    from_date=from_date,
+                    to_date=to_date,
+                    limit=limit,
+                    semaphore=semaphore
+                )
+                for state in STATES
+            ]
+
+        # Consume shards as they finish so `collected` always reflects
+        # completed work, even if the scan is cancelled part-way.
+        results = []
+        for task in asyncio.as_completed(tasks):
+            shard_records = await task
+            results.append(shard_records)
+            if collected is not None:
+                collected.append(shard_records)
+
+    # Border mandis occasionally come back under more than one state
+    # filter; dedupe on a stable record identity while merging, with
+    # O(1) inserts instead of a quadratic scan downstream.
+    seen = {}
+    fetched = 0
+    for state_records in results:
+        fetched += len(state_records)
+        for record in state_records:
+            key = (
+                record.get("market"),
+                record.get("commodity"),
+                record.get("variety"),
+                record.get("arrival_date"),
+                record.get("modal_price"),
+            )
+            seen.setdefault(key, record)
+
+    if fetched > len(seen):
+        print(f"Dropped {fetched - len(seen)} duplicate records across states.")
+    return list(seen.values())
+
+def _open_csv_output(filename):
+    """
+    Opens a CSV output target. A .gz filename gets gzip-compressed text
+    at level 1 — fast enough that the compressor outruns sustained disk
+    writes, for a 4-8x smaller file that pandas still reads directly.
+    """
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "wt", newline="", compresslevel=1)
+    return open(filename, "w", newline="")
+
 def save_to_csv(records, filename="mandi_prices_master.csv"):
     """Saves the list of records to a CSV file."""
     if not records:
@@ -205,17 +599,42 @@ def save_to_csv(records, filename="mandi_prices_master.csv"):
         return
 
     print(f"Saving {len(records)} records to {filename}...")
-    
-    # Using pandas for easy CSV handling and potential future data manipulation
-    df = pd.DataFrame(records)
-    
-    # Save to CSV
+
+    # Stream rows with csv.DictWriter: no dtype inference and no second
+    # full copy of the data inside a DataFrame.
+    fieldnames = list(records[0].keys())
+    seen_fields = set(fieldnames)
+    for record in records:
+        for key in record:
+            if key not in seen_fields:
+                seen_fields.add(key)
+                fieldnames.append(key)
+
     try:
-        df.to_csv(filename, index=False)
+        with _open_csv_output(filename) as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(records)
         print(f"Successfully saved data to {filename}")
     except Exception as e:
         print(f"Error saving CSV: {e}")
 
+def _estimate_total(api_key, commodity=None, state=None, district=None):
+    """
+    Reads data["total"] for a filter combination with one cheap limit=1
+    probe, to decide whether a query fits under the API pagination cap
+    or needs the per-state sharded scan. Returns None on failure.
+    """
+    try:
+        data = _get_page(_build_params(api_key, commodity, state, district, 1, 0))
+    except requests.exceptions.RequestException as e:
+        print(f"Network error while estimating result size: {e}")
+        return None
+    except Exception as e:
+        print(f"An error occurred while estimating result size: {e}")
+        return None
+    return data.get("total")
+
 def parse_date(date_str):
     """Helper to parse date arguments."""
     try:
@@ -231,59 +650,68 @@ def main():
     parser.add_argument("--district", "-d", help="Filter by District (e.g., 'Agra')")
     parser.add_argument("--from-date", type=parse_date, help="Start Date (DD/MM/YYYY)")
     parser.add_argument("--to-date", type=parse_date, help="End Date (DD/MM/YYYY)")
-    parser.add_argument("--output", "-o", default="mandi_prices_master.csv", help="Output CSV filename")
+    parser.add_argument("--output", "-o", default="mandi_prices_master.csv.gz", help="Output CSV filename (.gz writes gzip-compressed)")
 
     args = parser.parse_args()
 
     print("=== Agmarknet Mandi Price Scraper ===")
     api_key = get_api_key()
     
+    records = []
+    streamed_count = 0
+    partial_results = []  # shards completed so far, for Ctrl+C handling
+
     if not api_key:
         print("API Key not provided. Skipping API fetch.")
-        records = []
     else:
-        records = []
         try:
-            if not (args.commodity or args.state or args.district):
-                print("No filters provided. Initiating FULL SCAN by State to ensure complete data (bypassing 10k limit)...")
-                all_state_records = []
-                for state in STATES:
-                    print(f"\n--- Fetching for State: {state} ---")
-                    state_records = fetch_data(
-                        api_key, 
-                        commodity=args.commodity, 
-                        state=state, 
-                        district=args.district,
-                        from_date=args.from_date,
-                        to_date=args.to_date
-                    )
-                    all_state_records.extend(state_records)
-                    # Optional: Save intermediate progress?
-                    # valid: for now we just hold in memory or could append.
-                records = all_state_records
+            shard_by_state = not args.state and not args.district
+            if shard_by_state and args.commodity:
+                # A commodity-only query often fits under the API cap; one
+                # limit=1 probe tells us whether the 36-state fan-out is
+                # needed at all.
+                total = _estimate_total(api_key, commodity=args.commodity)
+                if total is not None and total <= API_RECORD_CAP:
+                    print(f"{total} records match the commodity filter; fetching directly without the per-state scan.")
+                    shard_by_state = False
+
+            if shard_by_state:
+                print("Initiating FULL SCAN by State to ensure complete data (bypassing 10k limit)...")
+                print(f"Fetching all {len(STATES)} states concurrently ({MAX_CONCURRENT_REQUESTS} requests in flight)...")
+                records = asyncio.run(fetch_all_states(
+                    api_key,
+                    commodity=args.commodity,
+                    district=args.district,
+                    from_date=args.from_date,
+                    to_date=args.to_date,
+                    collected=partial_results
+                ))
             else:
-                records = fetch_data(
-                    api_key, 
-                    commodity=args.commodity, 
-                    state=args.state, 
+                # Filtered queries stream straight to the output CSV so the
+                # full result set is never held in memory.
+                streamed_count = fetch_data(
+                    api_key,
+                    commodity=args.commodity,
+                    state=args.state,
                     district=args.district,
                     from_date=args.from_date,
-                    to_date=args.to_date
+                    to_date=args.to_date,
+                    output_path=args.output
                 )
         except KeyboardInterrupt:
             print("\n\n[!] Scraping interrupted by user.")
-            if 'all_state_records' in locals() and all_state_records:
-                print(f"Saving {len(all_state_records)} records collected so far...")
-                records = all_state_records
-            elif 'records' in locals() and records:
-                 print(f"Saving {len(records)} records collected so far...")
+            records = [record for shard in partial_results for record in shard]
+            if records:
+                print(f"Saving {len(records)} records collected so far...")
             else:
-                 print("No records collected yet.")
-                 sys.exit(0)
+                print("No records collected yet.")
+                sys.exit(0)
     
     if records:
         save_to_csv(records, filename=args.output)
         print("Scraping completed.")
+    elif streamed_count:
+        print("Scraping completed.")
     else:
         print("No data found from API.")
         choice = input("Would you like to try web scraping agmarknet.gov.in instead? (y/n): ").lower()